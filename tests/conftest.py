@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# Keep the app's local stores (SQLite, caches, cubes) out of the working tree and its background
+# threads off while the module is imported by the tests
+os.environ.setdefault("SAUDA_DATA_DIR", tempfile.mkdtemp(prefix="sauda-tests-"))
+os.environ.setdefault("SAUDA_CACHE_SNAPSHOT_INTERVAL", "0")
+os.environ.setdefault("SAUDA_ALERT_INTERVAL", "0")
+os.environ.setdefault("SAUDA_DATA_BACKEND", "replay")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
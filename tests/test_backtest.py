@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+LOOKBACKS = (20, 60)
+STRONG = (5, 8)
+MODERATE = (2, 5)
+HORIZON = 10
+
+
+@pytest.fixture(scope="module")
+def price_matrix():
+    rng = np.random.default_rng(3)
+    dates = pd.bdate_range("2020-01-01", periods=450)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0002, 0.015, (len(dates), 3)), axis=0))
+    close[:40, 2] = np.nan  # A ticker that starts trading later
+    return pd.DataFrame(close, index=dates, columns=["ZW=F", "ZC=F", "KC=F"])
+
+
+def naive_bucket(change, strong, moderate):
+    if change > strong:
+        return 4
+    if change > moderate:
+        return 3
+    if change < -strong:
+        return 0
+    if change < -moderate:
+        return 1
+    return 2
+
+
+def naive_ma_state(close, ma50, ma200):
+    if close > ma50 and ma50 > ma200:
+        return 1
+    if close < ma50 and ma50 < ma200:
+        return 2
+    if close > ma50 and ma50 < ma200:
+        return 3
+    if close < ma50 and ma50 > ma200:
+        return 4
+    return 0
+
+
+def naive_statistics(directions):
+    signals, hits, pnl = 0, 0, 0.0
+    for close, direction_at in directions:
+        for t in range(len(close) - HORIZON):
+            direction = direction_at(close, t)
+            future = (close[t + HORIZON] / close[t] - 1) * 100
+            if not direction or np.isnan(future):
+                continue
+            signals += 1
+            hits += direction * future > 0
+            pnl += direction * future
+    return signals, hits, pnl
+
+
+def naive_backtest(price_matrix, user_type):
+    rows = []
+    series = [price_matrix[ticker].to_numpy() for ticker in price_matrix]
+    for lookback in LOOKBACKS:
+        for strong in STRONG:
+            for moderate in MODERATE:
+                if moderate >= strong:
+                    continue
+
+                def trend_direction(close, t):
+                    if t < lookback - 1:
+                        return 0
+                    change = (close[t] / close[t - lookback + 1] - 1) * 100
+                    if np.isnan(change):
+                        return 0
+                    return app.ADVICE_DIRECTIONS[user_type][naive_bucket(change, strong, moderate)]
+                rows.append(naive_statistics([(close, trend_direction) for close in series]))
+
+    averages = [(pd.Series(close).rolling(50).mean().to_numpy(), pd.Series(close).rolling(200).mean().to_numpy())
+                for close in series]
+
+    def ma_direction(averages):
+        ma50, ma200 = averages
+
+        def direction(close, t):
+            if np.isnan(ma200[t]) or np.isnan(close[t]):
+                return 0
+            return app.MA_DIRECTIONS[naive_ma_state(close[t], ma50[t], ma200[t])]
+        return direction
+    rows.append(naive_statistics([(close, ma_direction(pair)) for close, pair in zip(series, averages)]))
+    return rows
+
+
+@pytest.mark.parametrize("user_type", list(app.ADVICE_DIRECTIONS))
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_vectorized_backtest_matches_per_bar_loop(price_matrix, user_type, max_workers):
+    results = app.run_price_rule_backtest(price_matrix, user_type, LOOKBACKS, STRONG, MODERATE,
+                                          horizon=HORIZON, max_workers=max_workers)
+    expected = naive_backtest(price_matrix, user_type)
+    assert len(results) == len(expected)
+    for (_, row), (signals, hits, pnl) in zip(results.iterrows(), expected):
+        assert row["signals"] == signals
+        assert row["total_pnl_pct"] == pytest.approx(pnl, rel=1e-9, abs=1e-9)
+        if signals:
+            assert row["hit_rate"] == pytest.approx(hits / signals * 100)
+
+
+def test_track_record_buckets_every_signal_once(price_matrix):
+    close = price_matrix["ZW=F"].to_numpy()
+    summary = app.summarize_advice_track_record(close, "Buyer", lookback=60, strong=8, moderate=3, horizon=HORIZON)
+    codes = app.trend_bucket_codes(app.lookback_percent_change(close.reshape(-1, 1), 60), 8, 3)[:, 0]
+    assert summary["trend"]["signals"].sum() == (codes[:-HORIZON] >= 0).sum()
+    assert summary["trend_current"] == app.TREND_BUCKETS[codes[-1]]
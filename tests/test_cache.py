@@ -0,0 +1,50 @@
+import threading
+
+import app
+
+
+def test_cache_resource_keeps_recent_arguments_per_function():
+    calls = []
+
+    @app.cache_resource(max_entries=2)
+    def summary(version, side):
+        calls.append((version, side))
+        return f"{side}@{version}"
+
+    for _ in range(3):
+        assert summary(1, "Buyer") == "Buyer@1"
+        assert summary(1, "Seller") == "Seller@1"
+    assert calls == [(1, "Buyer"), (1, "Seller")]
+    summary(2, "Buyer")
+    summary(1, "Buyer")  # Evicted as the least recently used entry
+    assert calls[-2:] == [(2, "Buyer"), (1, "Buyer")]
+
+
+def test_slow_resource_build_does_not_block_other_resources_or_repeat_work():
+    release = threading.Event()
+    started = threading.Event()
+    builds = []
+
+    @app.cache_resource
+    def slow_cube(version):
+        builds.append(version)
+        started.set()
+        release.wait(10)
+        return version
+
+    @app.cache_resource
+    def fast_lookup(version):
+        return version * 2
+
+    threads = [threading.Thread(target=slow_cube, args=(1,)) for _ in range(3)]
+    threads[0].start()
+    assert started.wait(10)
+    for thread in threads[1:]:
+        thread.start()
+    # Another resource and the version store stay available while the cube builds
+    assert fast_lookup(21) == 42
+    assert app.get_data_version("price", "ZW=F") == 0
+    release.set()
+    for thread in threads:
+        thread.join(10)
+    assert builds == [1]
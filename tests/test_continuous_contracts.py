@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+CONTRACTS = [("ZWH24.CBT", pd.Timestamp("2024-03-01")), ("ZWK24.CBT", pd.Timestamp("2024-05-01")),
+             ("ZWN24.CBT", pd.Timestamp("2024-07-01"))]
+
+
+# Every contract tracks one underlying path at its own level, so roll ratios are known exactly
+def contract_history(start, end, level):
+    dates = pd.bdate_range(start, end)
+    close = pd.Series(level * (600 + np.arange(len(dates)) + len(pd.bdate_range("2023-12-01", start)) - 1),
+                      index=dates, dtype=float)
+    return pd.DataFrame({"Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+                         "Adj Close": close, "Volume": 100.0})
+
+
+@pytest.fixture
+def histories():
+    return {"ZWH24.CBT": contract_history("2023-12-01", "2024-02-29", 1.0),
+            "ZWK24.CBT": contract_history("2024-01-02", "2024-04-30", 1.1),
+            "ZWN24.CBT": contract_history("2024-03-01", "2024-06-28", 1.1 * 0.95)}
+
+
+def test_roll_factors_are_close_ratios_on_the_last_common_day(histories):
+    rolls = app.build_roll_schedule(CONTRACTS, histories)
+    assert list(rolls["from"]) == ["ZWH24.CBT", "ZWK24.CBT"]
+    assert list(rolls["roll_date"]) == [delivery - pd.offsets.BDay(app.ROLL_BUSINESS_DAYS)
+                                        for _, delivery in CONTRACTS[:-1]]
+    for roll in rolls.to_dict("records"):
+        day = roll["roll_date"]
+        assert roll["adjusted"]
+        assert roll["factor"] == pytest.approx(histories[roll["to"]].loc[day, "Close"] / histories[roll["from"]].loc[day, "Close"])
+    np.testing.assert_allclose(rolls["factor"], [1.1, 0.95])
+
+
+def test_stitched_series_is_ratio_back_adjusted_without_roll_jumps(histories):
+    rolls = app.build_roll_schedule(CONTRACTS, histories)
+    front_month = contract_history("2023-12-01", "2024-06-28", 0.8)
+    stitched = app.stitch_continuous_contract(front_month, CONTRACTS, histories, rolls)
+
+    first_roll, second_roll = rolls["roll_date"]
+    march = histories["ZWH24.CBT"]["Close"]
+    may = histories["ZWK24.CBT"]["Close"]
+    july = histories["ZWN24.CBT"]["Close"]
+    # Each segment is scaled by the factors of every later roll; the last contract is unadjusted
+    early = stitched.index <= first_roll
+    np.testing.assert_allclose(stitched["Close"][early], march[stitched.index[early]] * rolls["factor"].prod())
+    middle = (stitched.index > first_roll) & (stitched.index <= second_roll)
+    np.testing.assert_allclose(stitched["Close"][middle], may[stitched.index[middle]] * rolls["factor"].iloc[1])
+    late = stitched.index > second_roll
+    np.testing.assert_allclose(stitched["Close"][late], july[stitched.index[late]])
+    # Back-adjusted onto the last contract's level, the shared path has no jump at either roll
+    np.testing.assert_allclose(np.diff(stitched["Close"].to_numpy()), 1.1 * 0.95)
+    assert stitched.index.is_unique and stitched.index.is_monotonic_increasing
+
+
+def test_missing_contract_rolls_unadjusted_onto_the_front_month(histories):
+    del histories["ZWK24.CBT"]
+    rolls = app.build_roll_schedule(CONTRACTS, histories)
+    assert list(rolls["factor"]) == [1.0, 1.0]
+    assert not rolls["adjusted"].any()
+    front_month = contract_history("2023-12-01", "2024-06-28", 0.8)
+    stitched = app.stitch_continuous_contract(front_month, CONTRACTS, histories, rolls)
+    middle = stitched.index[(stitched.index > rolls["roll_date"].iloc[0]) & (stitched.index <= rolls["roll_date"].iloc[1])]
+    np.testing.assert_allclose(stitched.loc[middle, "Close"], front_month.loc[middle, "Close"])
@@ -0,0 +1,79 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+def simulator_closes(bars=600):
+    feed = app.SimulatedPriceFeed("ZW=F", history_bars=bars, mode="bar", seed=7,
+                                  start_time=pd.Timestamp("2024-01-02 09:30"))
+    return [bar["close"] for bar in feed.history()]
+
+
+def test_ring_buffer_matches_numpy_over_many_cycles():
+    rng = np.random.default_rng(0)
+    values = rng.normal(100, 5, 1000)
+    buffer = app.RingBuffer(50)
+    for i, value in enumerate(values):
+        buffer.append(value)
+        window = values[max(0, i - 49):i + 1]
+        assert buffer.mean() == pytest.approx(window.mean(), rel=1e-12)
+        if len(window) > 1:
+            assert buffer.std() == pytest.approx(window.std(ddof=1), rel=1e-9)
+        assert buffer.oldest() == window[0]
+        assert buffer.newest() == window[-1]
+    np.testing.assert_array_equal(buffer.to_array(), values[-50:])
+
+
+def test_incremental_indicators_match_pandas_on_simulator_feed():
+    closes = simulator_closes()
+    indicators = app.IncrementalPriceIndicators(trend_window=60, volatility_window=30, periods_per_year=252)
+    snapshots = pd.DataFrame([indicators.update(close) for close in closes])
+
+    close = pd.Series(closes)
+    pd.testing.assert_series_equal(snapshots["MA50"], close.rolling(50).mean(), check_names=False)
+    pd.testing.assert_series_equal(snapshots["MA200"], close.rolling(200).mean(), check_names=False)
+    for i in [1, 29, 59, 60, 250, len(closes) - 1]:
+        trend = close.iloc[max(0, i - 59):i + 1]
+        assert snapshots["Percent_Change"][i] == pytest.approx((trend.iloc[-1] - trend.iloc[0]) / trend.iloc[0] * 100)
+        returns = close.iloc[max(0, i - 29):i + 1].pct_change().dropna()
+        if len(returns) > 1:
+            assert snapshots["Volatility"][i] == pytest.approx(returns.std() * 252 ** 0.5 * 100, rel=1e-8)
+
+
+def test_indicator_state_round_trips_through_json():
+    closes = simulator_closes(300)
+    original = app.IncrementalPriceIndicators()
+    for close in closes[:250]:
+        original.update(close)
+    restored = app.IncrementalPriceIndicators.from_state(json.loads(json.dumps(original.get_state())))
+    for close in closes[250:]:
+        expected, actual = original.update(close), restored.update(close)
+        assert actual == pytest.approx(expected, rel=1e-12, nan_ok=True)
+
+
+class QuietFeed(app.PriceFeed):
+    def poll(self):
+        return []
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = 0
+
+    def __getattr__(self, name):
+        def record(*args, **kwargs):
+            self.calls += 1
+        return record
+
+
+def test_stream_touches_the_page_on_every_iteration_while_the_feed_is_quiet():
+    # Streamlit only notices a rerun request at the next st call, so a quiet feed must not go silent
+    chart, insights, status = Recorder(), Recorder(), Recorder()
+    stream = app.IntradayPriceStream(QuietFeed())
+    app.run_intraday_stream(stream, chart, insights, status, "Streaming", "Wheat", poll_seconds=0.01, max_seconds=0.1)
+    assert chart.calls == insights.calls == 0
+    assert status.calls >= 5
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import app
+
+
+def test_masked_candidates_are_excluded_from_scaling_and_ranked_last():
+    rng = np.random.default_rng(4)
+    features = rng.normal(size=(6, 4))
+    features[1, 2] = np.nan  # No data for one feature: neutral after z-scoring
+    mask = np.array([True, True, False, True, False, True])
+    weights = app.OPPORTUNITY_WEIGHTS["Buyer"]
+    scores, z = app.score_feature_matrix(features, weights, mask)
+
+    kept = features[mask]
+    expected_z = (kept - np.nanmean(kept, axis=0)) / np.nanstd(kept, axis=0)
+    np.testing.assert_allclose(z[mask], np.nan_to_num(expected_z))
+    np.testing.assert_allclose(scores[mask], np.nan_to_num(expected_z) @ weights)
+    assert np.isneginf(scores[~mask]).all()
+
+
+def test_batched_scores_match_scoring_each_matrix_alone():
+    rng = np.random.default_rng(5)
+    features = rng.normal(size=(3, 2, 7, 4))
+    mask = rng.random((3, 2, 7)) > 0.3
+    weights = app.OPPORTUNITY_WEIGHTS["Seller"]
+    scores, _ = app.score_feature_matrix(features, weights, mask)
+    for i in range(3):
+        for j in range(2):
+            alone, _ = app.score_feature_matrix(features[i, j], weights, mask[i, j])
+            np.testing.assert_allclose(scores[i, j], alone)
+
+
+@pytest.mark.parametrize("user_type", list(app.OPPORTUNITY_WEIGHTS))
+def test_rank_all_opportunities_returns_top_k_outside_the_region(monkeypatch, user_type):
+    commodities = ["Wheat", "Corn"]
+    regions = list(app.REGION_COUNTRIES)
+    countries = len(app.OPPORTUNITY_COUNTRIES)
+    rng = np.random.default_rng(6)
+    trade = rng.normal(size=(len(commodities), len(regions), countries, 2))
+    conditions = {commodity: rng.normal(size=(countries, 2)) for commodity in commodities}
+    monkeypatch.setattr(app, "get_trade_route_feature_tensor", lambda *args: trade)
+    monkeypatch.setattr(app, "get_region_condition_features", lambda commodity: conditions[commodity])
+
+    ranked = app.rank_all_opportunities(commodities, user_type, top_k=3)
+    assert len(ranked) == len(commodities) * len(regions) * 3
+    for i, commodity in enumerate(commodities):
+        for j, region in enumerate(regions):
+            rows = ranked[(ranked["commodity"] == commodity) & (ranked["region"] == region)]
+            features = app.build_opportunity_features(commodity, region, user_type, conditions[commodity], trade[i, j])
+            mask = app.opportunity_candidate_mask(region)
+            scores, _ = app.score_feature_matrix(features, app.OPPORTUNITY_WEIGHTS[user_type], mask)
+            best = np.argsort(-scores)[:3]
+            assert list(rows["rank"]) == [1, 2, 3]
+            assert list(rows["country"]) == [app.OPPORTUNITY_COUNTRIES[k][0] for k in best]
+            np.testing.assert_allclose(rows["score"], scores[best])
+            assert rows["score"].is_monotonic_decreasing
+            assert region not in {app.OPPORTUNITY_COUNTRIES[k][1] for k in best}
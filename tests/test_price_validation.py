@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+def raw_download(ticker="ZW=F", periods=120):
+    rng = np.random.default_rng(2)
+    dates = pd.bdate_range("2023-01-02", periods=periods, tz="America/New_York")
+    close = 500 * np.exp(np.cumsum(rng.normal(0, 0.01, periods)))
+    frame = pd.DataFrame({"Open": close * 0.999, "High": close * 1.01, "Low": close * 0.99,
+                          "Close": close, "Volume": 1000.0}, index=dates)
+    frame.columns = pd.MultiIndex.from_product([frame.columns, [ticker]], names=["Price", "Ticker"])
+    return frame
+
+
+@pytest.fixture
+def report_and_frame():
+    raw = raw_download()
+    dates = raw.index
+    raw.loc[dates[80], ("Close", "ZW=F")] *= 1.6  # One-bar bad print
+    raw.loc[dates[30], :] = np.nan  # Empty bar
+    raw.loc[dates[50], ("Close", "ZW=F")] = np.nan  # Missing close, carried forward
+    raw.loc[dates[60], ("High", "ZW=F")] = raw.loc[dates[60], ("Close", "ZW=F")] * 0.95  # High below the close
+    raw = pd.concat([raw, raw.iloc[[70]]])  # Duplicate bar
+    raw = raw.drop(dates[100:106])  # Two-week gap
+    data, report = app.validate_price_frame(raw, "ZW=F")
+    return raw, data, report
+
+
+def test_frame_is_flattened_and_cleaned(report_and_frame):
+    raw, data, report = report_and_frame
+    assert set(data.columns) == set(app.PRICE_FIELDS + ["Volume"])
+    assert data.index.tz is None and data.index.is_monotonic_increasing and data.index.is_unique
+    assert report["rows_in"] == len(raw)
+    assert report["rows_out"] == len(data) == len(raw) - 2
+    assert report["duplicates"] == 1
+    assert report["empty_bars"] == 1
+    assert len(report["gaps"]) == 1
+    assert not data[app.PRICE_FIELDS].isna().any().any()
+    assert (data["High"] >= data[["Open", "Close"]].max(axis=1)).all()
+    assert (data["Low"] <= data[["Open", "Close"]].min(axis=1)).all()
+
+
+def test_missing_close_is_carried_forward_and_spike_repaired(report_and_frame):
+    raw, data, report = report_and_frame
+    dates = data.index
+    assert report["filled_values"] == 1
+    assert data["Close"].iloc[dates.get_loc(pd.Timestamp("2023-03-13")) - 1] == data.loc["2023-03-13", "Close"]
+    assert report["repaired_spikes"] == 1
+    spike = pd.Timestamp("2023-04-24")
+    neighbours = data["Close"].iloc[[dates.get_loc(spike) - 1, dates.get_loc(spike) + 1]]
+    assert data.loc[spike, "Close"] == pytest.approx(neighbours.mean())
+    assert report["ohlc_fixed"] >= 1
+
+
+def test_long_run_of_missing_closes_is_dropped_not_filled():
+    raw = raw_download()
+    raw.iloc[40:48, raw.columns.get_loc(("Close", "ZW=F"))] = np.nan
+    data, report = app.validate_price_frame(raw, "ZW=F")
+    # The first PRICE_GAP_FILL_LIMIT missing closes are carried forward; the rest of the run is dropped
+    assert report["filled_values"] == app.PRICE_GAP_FILL_LIMIT
+    assert report["unfilled_bars"] == 8 - app.PRICE_GAP_FILL_LIMIT
+    assert len(data) == len(raw) - report["unfilled_bars"]
+    assert "bars without a close dropped" in app.describe_price_quality(report)
+
+
+def test_frame_without_close_reports_an_error():
+    raw = raw_download().drop(columns="Close", level=0)
+    data, report = app.validate_price_frame(raw, "ZW=F")
+    assert data.empty
+    assert report["error"] == "no recognizable Close column"
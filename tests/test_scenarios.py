@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+@pytest.fixture(scope="module")
+def close():
+    rng = np.random.default_rng(11)
+    dates = pd.bdate_range("2021-01-01", periods=700)
+    return pd.Series(250 * np.exp(np.cumsum(rng.normal(0.0003, 0.012, len(dates)))), index=dates)
+
+
+def test_parallel_and_serial_runs_are_identical(close):
+    serial = app.run_price_scenarios(close, n_paths=12000, horizon=30, seed=5)
+    parallel = app.run_price_scenarios(close, n_paths=12000, horizon=30, seed=5, parallel=True, max_workers=2)
+    pd.testing.assert_frame_equal(serial["bands"], parallel["bands"])
+    assert serial["risk"] == parallel["risk"]
+    assert serial["probability_up"] == parallel["probability_up"]
+
+
+def test_vectorized_bands_and_risk_match_path_by_path_rebuild(close):
+    n_paths, horizon, seed = 7000, 20, 9
+    result = app.run_price_scenarios(close, n_paths=n_paths, horizon=horizon, seed=seed)
+
+    # Redraw the same bootstrap indices chunk by chunk and walk every path one day at a time
+    log_returns = np.diff(np.log(close.to_numpy()[-(app.SCENARIO_LOOKBACK + 1):]))
+    last_price = close.iloc[-1]
+    chunks = [min(app.SCENARIO_CHUNK_PATHS, n_paths - start) for start in range(0, n_paths, app.SCENARIO_CHUNK_PATHS)]
+    paths = []
+    for size, chunk_seed in zip(chunks, np.random.SeedSequence(seed).spawn(len(chunks))):
+        draws = np.random.default_rng(chunk_seed).integers(0, len(log_returns), size=(size, horizon))
+        for row in draws:
+            price, path = last_price, []
+            for index in row:
+                price *= np.exp(log_returns[index])
+                path.append(price)
+            paths.append(path)
+    paths = np.array(paths, dtype=np.float32)
+
+    for percentile in app.SCENARIO_PERCENTILES:
+        expected = [np.percentile(paths[:, day], percentile) for day in range(horizon)]
+        np.testing.assert_allclose(result["bands"][f"P{percentile}"], expected, rtol=1e-5)
+    final = paths[:, -1].astype(float)
+    high_tail = np.percentile(final, app.SCENARIO_VAR_LEVEL)
+    low_tail = np.percentile(final, 100 - app.SCENARIO_VAR_LEVEL)
+    assert result["risk"]["Buyer"]["var"] == pytest.approx(high_tail - last_price, rel=1e-4)
+    assert result["risk"]["Seller"]["var"] == pytest.approx(last_price - low_tail, rel=1e-4)
+    assert result["probability_up"] == pytest.approx((final > last_price).mean(), abs=1e-3)
+
+
+def test_gbm_paths_follow_the_fitted_return_distribution(close):
+    log_returns = np.diff(np.log(close.to_numpy()))
+    paths = app.simulate_price_paths(log_returns, 100.0, 20000, 10, "gbm", 1).astype(float)
+    steps = np.diff(np.log(np.hstack([np.full((len(paths), 1), 100.0), paths])), axis=1)
+    assert steps.mean() == pytest.approx(log_returns.mean(), abs=2e-4)
+    assert steps.std() == pytest.approx(log_returns.std(ddof=1), rel=0.02)
+
+
+def test_short_history_has_no_scenarios(close):
+    assert app.run_price_scenarios(close.iloc[:15]) is None
@@ -0,0 +1,55 @@
+import os
+
+import pandas as pd
+import pytest
+
+import app
+
+
+@pytest.fixture
+def trade_dirs(tmp_path, monkeypatch):
+    archive_dir = tmp_path / "raw"
+    archive_dir.mkdir()
+    monkeypatch.setattr(app, "TRADE_ARCHIVE_DIR", str(archive_dir))
+    monkeypatch.setattr(app, "TRADE_CUBE_DIR", str(tmp_path / "cube"))
+    return archive_dir
+
+
+def write_dump(path, volume, version):
+    pd.DataFrame({"date": ["2024-01-15", "2024-01-20", "2024-02-10"], "exporter": "Brazil", "importer": "China",
+                  "commodity": "Soybeans", "volume_mt": volume, "value_usd": volume * 400.0}).to_csv(path, index=False)
+    os.utime(path, (version, version))  # Distinct mtimes even within one second
+
+
+def cube_totals():
+    cube = pd.read_parquet(app.trade_cube_path("cube.parquet"))
+    return cube.groupby("month")["volume"].sum().to_dict()
+
+
+def test_changed_dump_is_not_double_counted(trade_dirs):
+    write_dump(trade_dirs / "a.csv", 100.0, 1_000_000)
+    write_dump(trade_dirs / "b.csv", 10.0, 1_000_000)
+    assert app.ingest_trade_archives() == 6
+    assert cube_totals() == {pd.Timestamp("2024-01-01"): 220.0, pd.Timestamp("2024-02-01"): 110.0}
+
+    write_dump(trade_dirs / "a.csv", 50.0, 2_000_000)
+    assert app.ingest_trade_archives() == 3  # Only the changed dump is read again
+    assert cube_totals() == {pd.Timestamp("2024-01-01"): 120.0, pd.Timestamp("2024-02-01"): 60.0}
+    assert app.ingest_trade_archives() == 0
+    assert cube_totals() == {pd.Timestamp("2024-01-01"): 120.0, pd.Timestamp("2024-02-01"): 60.0}
+
+
+def test_deleted_dump_is_dropped_from_the_cube(trade_dirs):
+    write_dump(trade_dirs / "a.csv", 100.0, 1_000_000)
+    write_dump(trade_dirs / "b.csv", 10.0, 1_000_000)
+    app.ingest_trade_archives()
+    removed = str(trade_dirs / "b.csv")
+    os.remove(removed)
+
+    app.ingest_trade_archives()
+    assert cube_totals() == {pd.Timestamp("2024-01-01"): 200.0, pd.Timestamp("2024-02-01"): 100.0}
+    assert not os.path.exists(app.trade_part_path(removed))
+
+    os.remove(trade_dirs / "a.csv")
+    app.ingest_trade_archives()
+    assert not os.path.exists(app.trade_cube_path("cube.parquet"))
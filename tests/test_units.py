@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+@pytest.fixture
+def fx_rates(monkeypatch):
+    # Fixings on Monday and Thursday only; the rest of the week carries the last one forward
+    table = pd.DataFrame({"CAD": [0.74, 0.75], "USD": 1.0},
+                         index=pd.to_datetime(["2024-03-04", "2024-03-07"]))
+    monkeypatch.setattr(app, "get_fx_rates", lambda: table)
+    monkeypatch.setitem(app.CONTRACT_SPECS, "RS=F", ("CAD/MT", "CAD", 1.0))
+    return table
+
+
+def test_unit_factors_turn_quotes_into_usd_per_metric_ton(fx_rates):
+    index = pd.bdate_range("2024-03-04", periods=3)
+    factors = app.get_usd_per_mt_factors(["ZW=F", "ZC=F", "ZL=F", "CC=F", "ZR=F", "DBA"], index)
+    assert factors.shape == (3, 6)
+    # Wheat at 600 cents/bu is ~220 USD/MT, corn at 450 cents/bu ~177 USD/MT
+    assert 600 * factors[0, 0] == pytest.approx(600 / 100 * 2204.62 / 60)
+    assert 450 * factors[0, 1] == pytest.approx(450 / 100 * 2204.62 / 56)
+    assert factors[0, 2] == pytest.approx(22.0462)
+    assert factors[0, 3] == 1.0
+    assert factors[0, 4] == pytest.approx(22.0462)
+    assert np.isnan(factors[:, 5]).all()  # No physical basis: left in native units
+
+
+def test_fx_fixings_are_carried_forward(fx_rates):
+    index = pd.date_range("2024-03-01", "2024-03-11")
+    factors = pd.Series(app.get_usd_per_mt_factors(["RS=F"], index)[:, 0], index=index)
+    assert factors[:"2024-03-03"].isna().all()  # Before the first fixing there is no rate to use
+    np.testing.assert_allclose(factors["2024-03-04":"2024-03-06"], 0.74)
+    np.testing.assert_allclose(factors["2024-03-07":"2024-03-11"], 0.75)
+
+
+def test_price_matrix_is_converted_in_one_multiply(fx_rates):
+    index = pd.bdate_range("2024-03-04", periods=4)
+    prices = pd.DataFrame({"ZW=F": 600.0, "RS=F": 800.0}, index=index)
+    converted = app.normalize_price_matrix(prices)
+    np.testing.assert_allclose(converted["ZW=F"], 600 * app.CONTRACT_SPECS["ZW=F"][2])
+    np.testing.assert_allclose(converted["RS=F"], 800 * np.array([0.74, 0.74, 0.74, 0.75]))
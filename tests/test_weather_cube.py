@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+AREA = app.WEATHER_CUBE_AREAS.index(("Asia", "Java"))
+MONTH = (2000 - app.WEATHER_CUBE_START_YEAR) * 12
+
+
+@pytest.fixture
+def weather_dirs(tmp_path, monkeypatch):
+    archive_dir = tmp_path / "raw"
+    archive_dir.mkdir()
+    monkeypatch.setattr(app, "WEATHER_ARCHIVE_DIR", str(archive_dir))
+    monkeypatch.setattr(app, "WEATHER_CUBE_DIR", str(tmp_path / "cube"))
+    return archive_dir
+
+
+def write_archive(path, temperature, version):
+    days = pd.date_range("2000-01-01", periods=31)
+    pd.DataFrame({"date": days, "region": "Asia", "area": "Java", "temperature": temperature,
+                  "rainfall": 2.0}).to_csv(path, index=False)
+    os.utime(path, (version, version))  # Distinct mtimes even within one second
+
+
+def january_2000_temperature():
+    return float(np.load(app.weather_cube_path("monthly.npy"))[AREA, MONTH, 0])
+
+
+def test_changed_archive_replaces_its_contribution(weather_dirs):
+    write_archive(weather_dirs / "a.csv", 10.0, 1_000_000)
+    write_archive(weather_dirs / "b.csv", 20.0, 1_000_000)
+    assert app.ingest_weather_archives() == 62
+    assert january_2000_temperature() == pytest.approx(15.0)
+
+    write_archive(weather_dirs / "a.csv", 30.0, 2_000_000)
+    assert app.ingest_weather_archives() == 31  # Only the changed file is read again
+    # Double counting would average the old and new copies of a.csv with b.csv (20.0)
+    assert january_2000_temperature() == pytest.approx(25.0)
+    assert app.ingest_weather_archives() == 0
+    assert january_2000_temperature() == pytest.approx(25.0)
+
+
+def test_deleted_archive_is_dropped_from_the_cube(weather_dirs):
+    write_archive(weather_dirs / "a.csv", 10.0, 1_000_000)
+    write_archive(weather_dirs / "b.csv", 20.0, 1_000_000)
+    app.ingest_weather_archives()
+    removed = str(weather_dirs / "b.csv")
+    os.remove(removed)
+
+    app.ingest_weather_archives()
+    assert january_2000_temperature() == pytest.approx(10.0)
+    assert not os.path.exists(app.weather_part_path(removed))
+    cube_files = os.listdir(app.WEATHER_CUBE_DIR)
+    assert not [name for name in cube_files if name.endswith(".tmp")]
+    assert {"monthly.npy", "climatology.npy", "anomalies.npy", "manifest.json"} <= set(cube_files)